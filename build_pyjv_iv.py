@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+'''
+    Ahead-of-time compiles the single-diode IV kernel into the pyjv_iv
+     extension module, which singlediodeIV imports when it is present.
+    Run once with numba installed:  python build_pyjv_iv.py
+'''
+
+import os
+
+from numba.pycc import CC
+
+from singlediodeIV import KERNEL_VERSION, _iv_kernel
+
+cc = CC('pyjv_iv')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# same source as the JIT kernel, specialized for float64 input
+cc.export('iv_kernel',
+          'f8[:](f8[:], f8, f8, f8, f8, f8)')(_iv_kernel.py_func)
+
+
+# lets singlediodeIV reject a build whose arguments no longer match
+@cc.export('kernel_version', 'i8()')
+def kernel_version():
+    return KERNEL_VERSION
+
+
+if __name__ == '__main__':
+    cc.compile()
@@ -0,0 +1,166 @@
+import types
+
+import numpy as np
+import pytest
+
+import singlediodeIV
+from singlediodeIV import K_B, SingleDiode, testing_params
+
+# dark and illuminated versions of the example diode
+PARAMS = [dict(testing_params),
+          dict(testing_params, I_ph=1.0E-3)]
+
+
+@pytest.fixture(params=['jit', 'numpy', 'aot'])
+def iv_path(request, monkeypatch):
+    '''
+        Pins i_from_v to one evaluator: the numba JIT kernel, the NumPy
+         expression, or the ahead-of-time pyjv_iv build.
+    '''
+    if request.param == 'jit':
+        if not singlediodeIV.HAS_NUMBA:
+            pytest.skip('numba is not installed')
+        monkeypatch.setattr(singlediodeIV, 'pyjv_iv', None)
+    elif request.param == 'numpy':
+        monkeypatch.setattr(singlediodeIV, 'HAS_NUMBA', False)
+        monkeypatch.setattr(singlediodeIV, 'pyjv_iv', None)
+    else:
+        if singlediodeIV.pyjv_iv is None:
+            pytest.skip('pyjv_iv is not built')
+        # without numba the extension takes every float64 sweep
+        monkeypatch.setattr(singlediodeIV, 'HAS_NUMBA', False)
+    return request.param
+
+
+@pytest.mark.parametrize('params', PARAMS, ids=['dark', 'light'])
+def test_generateIV_satisfies_diode_equation(iv_path, params):
+    V, I = SingleDiode(params).generateIV()
+
+    n, T, I0 = params['n'], params['T'], params['I_0']
+    Iph, Rs, Rsh = params['I_ph'], params['R_s'], params['R_sh']
+    nVth = n*K_B*T
+
+    # the implicit equation is written for the generated current
+    Ig = -I
+    residual = (Iph - I0*(np.exp((V + Ig*Rs)/nVth) - 1.0)
+                - (V + Ig*Rs)/Rsh - Ig)
+    assert np.max(np.abs(residual)) < 1.0E-14
+
+
+@pytest.mark.parametrize('params', PARAMS, ids=['dark', 'light'])
+def test_v_from_i_inverts_i_from_v(iv_path, params):
+    diode = SingleDiode(params)
+    V = np.linspace(-2.0, 1.0, 301)
+    np.testing.assert_allclose(diode.v_from_i(diode.i_from_v(V)), V,
+                               rtol=0.0, atol=1.0E-12)
+
+
+# u across the range where exp(u) is finite, bunched around the u = 1
+#  switch between the two iterations, plus the u -> -inf limit
+LAMBERTW_U = np.concatenate([
+    np.linspace(-700.0, 700.0, 14001),
+    1.0 + np.array([-1.0E-6, -1.0E-12, 0.0, 1.0E-12, 1.0E-6]),
+    [-1.0E3, -1.0E300, -np.inf]])
+
+
+def _lambertw_reference(u):
+    scipy_special = pytest.importorskip('scipy.special')
+    with np.errstate(over='ignore'):
+        return scipy_special.lambertw(np.exp(u)).real
+
+
+def test_lambertw0_log_matches_scipy():
+    expected = _lambertw_reference(LAMBERTW_U)
+    np.testing.assert_allclose(singlediodeIV._lambertw0_log(LAMBERTW_U),
+                               expected, rtol=1.0E-14, atol=1.0E-300)
+
+
+def test_iv_kernel_lambertw_matches_scipy():
+    if not singlediodeIV.HAS_NUMBA:
+        pytest.skip('numba is not installed')
+
+    # the kernel also forms slope*V, which is nan at V = -inf even with a
+    #  zero slope, so the -inf limit is covered by -1e300 here
+    u = LAMBERTW_U[np.isfinite(LAMBERTW_U)]
+    expected = _lambertw_reference(u)
+
+    # with these coefficients the kernel returns W(exp(V)) itself
+    w = singlediodeIV._iv_kernel(u, 0.0, 1.0, 0.0, 0.0, 1.0)
+    np.testing.assert_allclose(w, expected, rtol=1.0E-14, atol=1.0E-300)
+
+
+def test_generateIV_reversed_range_is_empty(iv_path):
+    IV = SingleDiode(testing_params).generateIV(Vmin=1.0, Vmax=-2.0)
+    assert IV.shape == (2, 0)
+
+
+@pytest.mark.parametrize('params', PARAMS, ids=['dark', 'light'])
+def test_generateIV_float32_matches_float64(iv_path, params):
+    diode = SingleDiode(params)
+    IV64 = diode.generateIV()
+    IV32 = diode.generateIV(dtype=np.float32)
+
+    assert IV32.dtype == np.float32
+    assert diode.currents.dtype == np.float32
+    assert diode.JV_data.dtype == np.float32
+
+    # the documented bound is relative to the peak current of the sweep
+    np.testing.assert_allclose(IV32[1], IV64[1], rtol=0.0,
+                               atol=1.0E-6*np.max(np.abs(IV64[1])))
+
+
+def test_batch_IV_matches_single_diodes():
+    parameters = {'n': np.array([1.2, 1.66, 2.0]),
+                  'I_0': np.array([1.0E-9, 3.32E-9, 1.0E-8]),
+                  'I_ph': np.array([0.0, 1.0E-3, 2.0E-3]),
+                  'R_s': 9.23}
+    V = np.linspace(-2.0, 1.0, 301)
+    I = SingleDiode.batch_IV(parameters, V)
+    assert I.shape == (3, V.size)
+
+    # R_s is shared by every set; T and R_sh take the SingleDiode defaults
+    for m in range(3):
+        diode = SingleDiode({'n': parameters['n'][m],
+                             'I_0': parameters['I_0'][m],
+                             'I_ph': parameters['I_ph'][m],
+                             'R_s': 9.23})
+        np.testing.assert_allclose(I[m], diode.i_from_v(V),
+                                   rtol=1.0E-12, atol=1.0E-18)
+
+
+def test_batch_IV_accepts_scalar_voltage():
+    I = SingleDiode.batch_IV({'n': np.array([1.2, 2.0])}, 0.5)
+    assert I.shape == (2, 1)
+    for m, n in enumerate((1.2, 2.0)):
+        expected = SingleDiode({'n': n}).i_from_v(0.5)
+        np.testing.assert_allclose(I[m, 0], expected, rtol=1.0E-12)
+
+
+@pytest.mark.parametrize('build', [
+    types.SimpleNamespace(),
+    types.SimpleNamespace(
+        kernel_version=lambda: singlediodeIV.KERNEL_VERSION - 1)],
+    ids=['unversioned', 'stale'])
+def test_mismatched_aot_build_is_ignored(build):
+    assert singlediodeIV._matching_build(build) is None
+
+
+def test_matching_aot_build_is_used():
+    build = types.SimpleNamespace(
+        kernel_version=lambda: singlediodeIV.KERNEL_VERSION)
+    assert singlediodeIV._matching_build(build) is build
+
+
+@pytest.mark.parametrize('area', [1.0, 0.25])
+def test_generateIV_JV_data(area):
+    diode = SingleDiode(dict(testing_params, area=area))
+    IV = diode.generateIV()
+
+    if area == 1.0:
+        # unit area shares the IV array rather than copying it
+        assert diode.JV_data is IV
+    else:
+        assert diode.JV_data is not IV
+        np.testing.assert_array_equal(diode.JV_data[0], IV[0])
+        np.testing.assert_allclose(diode.JV_data[1], IV[1]/area,
+                                   rtol=1.0E-15)